@@ -3,43 +3,55 @@ Web App for Excel Template Generator
 Responsive Flask app that works on mobile and desktop
 """
 
-from flask import Flask, render_template, request, send_file, jsonify
+from flask import Flask, Response, render_template, request, send_file, jsonify
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import json
+import queue
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from excel_generator import ExcelTemplateGenerator
-from werkzeug.utils import secure_filename
+from filename_utils import safe_filename
 import traceback
-import re
-
-def safe_filename(filename):
-    """Create safe filename while preserving Unicode characters"""
-    # Remove leading/trailing whitespace
-    filename = filename.strip()
-    # Replace spaces with underscores
-    filename = filename.replace(' ', '_')
-    # Remove only truly problematic characters: / \ : * ? " < > |
-    filename = re.sub(r'[/\\:*?"<>|]', '', filename)
-    # Remove leading dots
-    filename = filename.lstrip('.')
-
-    # Only use secure_filename for ASCII characters, otherwise keep Unicode
-    # Check if the filename contains non-ASCII characters
-    try:
-        filename.encode('ascii')
-        # If it's all ASCII, use secure_filename for extra safety
-        from werkzeug.utils import secure_filename
-        filename = secure_filename(filename)
-    except UnicodeEncodeError:
-        # If it contains Unicode characters, skip secure_filename to preserve them
-        pass
 
-    return filename if filename else 'output'
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson (C encoder/decoder) for jsonify() and request.json"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Put orjson's bytes in the response as-is instead of going through a str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype=self.mimetype)
 
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
+# Let a fronting nginx/Apache serve downloads via X-Sendfile when it is configured for it
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+
+# gzip/brotli for JSON, HTML, CSS and JS responses (downloads are sent as-is)
+if Compress is not None:
+    Compress(app)
 
 # Apply ProxyFix to handle requests coming through reverse proxies/tunnels
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
@@ -47,7 +59,7 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 # Create uploads folder
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Global generator instance
+# Global generator instance, shared by all request threads (it holds no per-request state)
 generator = None
 
 def init_generator():
@@ -55,9 +67,72 @@ def init_generator():
     global generator
     if os.path.exists('template.xlsx'):
         generator = ExcelTemplateGenerator('template.xlsx')
+        # Warm up LibreOffice now so the first PDF request doesn't pay its start-up
+        ExcelTemplateGenerator.start_pdf_server()
     else:
         raise FileNotFoundError("template.xlsx not found. Please ensure template.xlsx is in the app directory.")
 
+# Background generation jobs: job_id -> {'events': queue of progress events for /api/progress,
+# 'finished': time.monotonic() when the job ended, or None while it runs}
+jobs = {}
+job_executor = ThreadPoolExecutor(max_workers=4)
+# Finished jobs nobody streamed are dropped after this long
+JOB_TTL_SECONDS = 600
+# A progress stream gives up if the job reports nothing for this long
+PROGRESS_TIMEOUT_SECONDS = 300
+
+def reap_jobs():
+    """Forget finished jobs whose progress was never (fully) streamed"""
+    cutoff = time.monotonic() - JOB_TTL_SECONDS
+    for job_id, job in list(jobs.items()):
+        if job['finished'] is not None and job['finished'] < cutoff:
+            jobs.pop(job_id, None)
+
+def run_generate_job(job, excel_path, generate_pdf, company_name, sakadastro, address, invoice_number, items):
+    """Generate Excel and optionally PDF in a worker thread, reporting progress to the job queue"""
+    # The job is passed in rather than looked up: its stream may already have dropped it from jobs
+    events = job['events']
+    try:
+        events.put({'stage': 'excel', 'pct': 10})
+        generator.generate(
+            excel_path,
+            company_name=company_name,
+            sakadastro=sakadastro,
+            address=address,
+            invoice_number=invoice_number,
+            items=items
+        )
+
+        # Generate PDF if requested
+        pdf_path = None
+        if generate_pdf:
+            events.put({'stage': 'pdf', 'pct': 50})
+            pdf_path = os.path.splitext(excel_path)[0] + '.pdf'
+            generator.generate_pdf(excel_path, pdf_path)
+
+        events.put({
+            'stage': 'done',
+            'pct': 100,
+            'success': True,
+            'excel_file': os.path.basename(excel_path),
+            'pdf_file': os.path.basename(pdf_path) if pdf_path else None,
+            'message': 'Files generated successfully!'
+        })
+    except Exception as e:
+        print(f"Error: {traceback.format_exc()}")
+        events.put({'stage': 'error', 'error': str(e)})
+    finally:
+        job['finished'] = time.monotonic()
+        reap_jobs()
+
+# Load the template at import time so the first request doesn't pay for it
+# (with the debug reloader, only the serving child process needs it)
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    try:
+        init_generator()
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+
 @app.route('/')
 def index():
     """Main page"""
@@ -65,8 +140,9 @@ def index():
 
 @app.route('/api/generate', methods=['POST'])
 def generate():
-    """Generate Excel and optionally PDF"""
+    """Validate the form and start generating Excel (and optionally PDF) in the background"""
     try:
+        # Only happens if the template was missing at startup; retry in case it was added since
         if generator is None:
             init_generator()
         
@@ -88,18 +164,24 @@ def generate():
         items = []
         items_data = data.get('items', [])
         for item in items_data:
-            if item.get('type'):
-                try:
-                    quantity = float(item.get('quantity', 0)) if item.get('quantity') else ''
-                    price = float(item.get('price', 0)) if item.get('price') else ''
-                except ValueError:
-                    return jsonify({'error': f'Invalid quantity or price for item: {item.get("type")}'}), 400
-                
-                items.append({
-                    'type': item.get('type'),
-                    'quantity': quantity,
-                    'price': price
-                })
+            # Blank rows are the common case - skip them after a single lookup
+            item_type = item.get('type')
+            if not item_type:
+                continue
+
+            quantity = item.get('quantity')
+            price = item.get('price')
+            try:
+                quantity = float(quantity) if quantity else ''
+                price = float(price) if price else ''
+            except (ValueError, TypeError):
+                return jsonify({'error': f'Invalid quantity or price for item: {item_type}'}), 400
+
+            items.append({
+                'type': item_type,
+                'quantity': quantity,
+                'price': price
+            })
         
         # Create safe filename - keep the alphanumeric and basic chars, handle dots properly
         # Use custom safe_filename function that preserves Unicode
@@ -114,34 +196,45 @@ def generate():
         
         excel_path = os.path.join(app.config['UPLOAD_FOLDER'], filename_with_ext)
         
-        # Generate Excel
-        generator.generate(
-            excel_path,
-            company_name=company_name,
-            sakadastro=sakadastro,
-            address=address,
-            invoice_number=invoice_number,
-            items=items
+        # Run the slow part (Excel + LibreOffice) off the request thread
+        job_id = uuid.uuid4().hex
+        job = jobs[job_id] = {'events': queue.Queue(), 'finished': None}
+        job_executor.submit(
+            run_generate_job, job, excel_path, generate_pdf,
+            company_name, sakadastro, address, invoice_number, items
         )
-        
-        # Generate PDF if requested
-        pdf_path = None
-        if generate_pdf:
-            pdf_filename = filename_with_ext.replace('.xlsx', '.pdf')
-            pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], pdf_filename)
-            generator.generate_pdf(excel_path, pdf_path)
-        
-        return jsonify({
-            'success': True,
-            'excel_file': filename_with_ext,
-            'pdf_file': os.path.basename(pdf_path) if pdf_path else None,
-            'message': 'Files generated successfully!'
-        })
+
+        return jsonify({'success': True, 'job_id': job_id})
     
     except Exception as e:
         print(f"Error: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/progress/<job_id>')
+def progress(job_id):
+    """Stream progress of a generation job as server-sent events"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    events = job['events']
+
+    def stream():
+        # The job is forgotten once its stream ends, also when the client disconnects
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=PROGRESS_TIMEOUT_SECONDS)
+                except queue.Empty:
+                    event = {'stage': 'error', 'error': 'Timed out waiting for the job'}
+                yield f"data: {app.json.dumps(event)}\n\n"
+                if event['stage'] in ('done', 'error'):
+                    break
+        finally:
+            jobs.pop(job_id, None)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/download/<path:filename>')
 def download(filename):
     """Download generated file"""
@@ -151,12 +244,6 @@ def download(filename):
 
         print(f"Download request for: {filename}")
         print(f"Full path: {file_path}")
-        print(f"File exists: {os.path.exists(file_path)}")
-
-        if not os.path.exists(file_path):
-            print(f"File not found: {file_path}")
-            # Return a simple error message instead of JSON for direct browser access
-            return f"File not found: {filename}", 404
 
         # Determine mimetype
         if filename.endswith('.pdf'):
@@ -170,12 +257,21 @@ def download(filename):
 
         # Send file with attachment headers to force download
         # This should work for all browsers including iOS Safari
+        # Passing the path (not a file object) lets the server use wsgi.file_wrapper/sendfile
+        # with an explicit Content-Length, and conditional requests can be answered with 304
+        # (the ETag/Last-Modified come from the file, so a regenerated invoice is sent again)
         return send_file(
             file_path,
             mimetype=mimetype,
             as_attachment=True,
-            download_name=filename
+            download_name=filename,
+            conditional=True,
+            etag=True
         )
+    except FileNotFoundError:
+        print(f"File not found: {file_path}")
+        # Return a simple error message instead of JSON for direct browser access
+        return f"File not found: {filename}", 404
     except Exception as e:
         print(f"Download error: {e}")
         print(traceback.format_exc())
@@ -188,10 +284,9 @@ def health():
     return jsonify({'status': 'ok'})
 
 if __name__ == '__main__':
-    try:
-        init_generator()
+    if os.path.exists('template.xlsx'):
         # Run on 0.0.0.0 to allow access from mobile devices on same network
-        app.run(debug=True, host='0.0.0.0', port=5000)
-    except FileNotFoundError as e:
-        print(f"Error: {e}")
+        app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
+    else:
+        print("Error: template.xlsx not found. Please ensure template.xlsx is in the app directory.")
         print("Make sure template.xlsx exists in the jtrade directory")
@@ -4,6 +4,7 @@ Simple CLI interface for Excel Template Generator
 
 import os
 from excel_generator import ExcelTemplateGenerator
+from filename_utils import safe_filename
 
 
 def main():
@@ -27,7 +28,6 @@ def main():
         filename = filename.rsplit('.', 1)[0]
 
     # Sanitize filename to handle Unicode characters properly
-    from app import safe_filename
     filename = safe_filename(filename)
     output_file = f"{filename}.xlsx"
     
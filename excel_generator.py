@@ -3,9 +3,11 @@ Excel Template Generator
 Reads template.xls, applies specified cell changes, and generates new Excel files.
 """
 
+import io
 import os
+import re
+from collections import namedtuple
 from datetime import datetime
-from openpyxl import load_workbook as openpyxl_load_workbook
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 from copy import copy
@@ -13,12 +15,117 @@ from pathlib import Path
 import xlrd
 import subprocess
 import shutil
+import socket
+import time
+import tempfile
+import threading
+import atexit
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+try:
+    # lxml parses and serializes in C; the worksheet DOM fallback uses it when installed
+    from lxml import etree
+except ImportError:
+    etree = ET
+
+# SpreadsheetML namespaces and the qualified tag names used by the ElementTree fallback
+_NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_SHEET_DATA_TAG = f'{{{_NS_MAIN}}}sheetData'
+_ROW_TAG = f'{{{_NS_MAIN}}}row'
+_C_TAG = f'{{{_NS_MAIN}}}c'
+_V_TAG = f'{{{_NS_MAIN}}}v'
+_F_TAG = f'{{{_NS_MAIN}}}f'
+_IS_TAG = f'{{{_NS_MAIN}}}is'
+_T_TAG = f'{{{_NS_MAIN}}}t'
+
+# Serialize the fallback's worksheet with the template's default namespace (lxml keeps it by itself)
+ET.register_namespace('', _NS_MAIN)
+ET.register_namespace('r', _NS_REL)
+
+# Excel stores dates as days since its epoch, 1899-12-30
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+_SECONDS_PER_DAY = 86400.0
+
+# Template parts that are already compressed and gain nothing from deflate
+_COMPRESSED_MEDIA_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+# unoserver's XML-RPC port (what unoconvert talks to) and how long a fresh daemon may take to open it
+_PDF_SERVER_PORT = 2003
+_PDF_SERVER_START_TIMEOUT = 30
+
+# One invoice takes a millisecond or two, so generate_multiple() only starts a process pool
+# for batches large enough to outweigh starting the workers
+_PROCESS_POOL_MIN_JOBS = 64
+
+# One <c> element of the worksheet XML: cell reference, remaining attributes,
+# and body (None for a self-closing cell)
+_CELL_XML_RE = re.compile(rb'<c r="([A-Z]+[0-9]+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_CELL_T_ATTR_RE = re.compile(rb'\s+t="[^"]*"')
+_CELL_V_RE = re.compile(rb'<v>.*?</v>|<v/>', re.S)
+_SST_UNIQUE_COUNT_RE = re.compile(rb'(<sst\b[^>]*?\suniqueCount=")(\d+)(")')
+_SST_TOTAL_COUNT_RE = re.compile(rb'(<sst\b[^>]*?\scount=")(\d+)(")')
+
+
+def _cell_xml(ref, attrs, value, string_index=None):
+    """
+    Build the bytes of a <c> element holding value, keeping its other attributes (style).
+    Text goes into the shared string table through string_index (text -> index) if given.
+    """
+    if value is None:
+        return b'<c r="%s"%s/>' % (ref, attrs)
+
+    # Set value correctly depending on type.
+    # For numbers, use a plain <v> element. For strings, a shared string reference
+    attrs = _CELL_T_ATTR_RE.sub(b'', attrs)
+    # Datetime: write as Excel serial number so Excel will display formatted date/time
+    if isinstance(value, datetime):
+        serial = (value - _EXCEL_EPOCH).total_seconds() / _SECONDS_PER_DAY
+        return b'<c r="%s"%s><v>%s</v></c>' % (ref, attrs, repr(serial).encode())
+    # Numeric types (int/float)
+    if isinstance(value, (int, float)):
+        return b'<c r="%s"%s><v>%s</v></c>' % (ref, attrs, str(value).encode())
+    if string_index is not None:
+        return b'<c r="%s"%s t="s"><v>%d</v></c>' % (ref, attrs, string_index(str(value)))
+    # Template without a shared string table: use an inline string
+    text = escape(str(value)).encode('utf-8')
+    return b'<c r="%s"%s t="inlineStr"><is><t>%s</t></is></c>' % (ref, attrs, text)
+
+
+# One invoice for generate_multiple()
+InvoiceSpec = namedtuple('InvoiceSpec', 'filename company sakadastro address invoice_number items changes')
+
+
+def _normalize_invoice(item):
+    """Turn a generate_multiple() 5-, 6- or 7-tuple into an InvoiceSpec"""
+    if len(item) == 7:
+        return InvoiceSpec(*item)
+    if len(item) == 5:
+        return InvoiceSpec(*item, items=[], changes={})
+    # 6-tuple: the last element is either the items list or the changes dict
+    *fields, items_or_changes = item
+    if isinstance(items_or_changes, list):
+        return InvoiceSpec(*fields, items=items_or_changes, changes={})
+    return InvoiceSpec(*fields, items=[], changes=items_or_changes)
 
 
 class ExcelTemplateGenerator:
+    # Warm LibreOffice daemon (unoserver) shared by every generator in this process
+    _pdf_server = None
+    _pdf_server_ready = False
+    _pdf_server_lock = threading.Lock()
+    # LibreOffice profile directory of each converting thread (see _libreoffice_profile)
+    _libreoffice_profiles = threading.local()
+
     def __init__(self, template_path):
         """
         Initialize with template file path.
+        The template is only read here; generate() keeps no per-call state,
+        so one instance can be shared by concurrent request threads.
         
         Args:
             template_path (str): Path to the template Excel file (.xls or .xlsx)
@@ -26,317 +133,379 @@ class ExcelTemplateGenerator:
         self.template_path = template_path
         if not os.path.exists(template_path):
             raise FileNotFoundError(f"Template file not found: {template_path}")
+
+        # Read the template once; every generated file starts from these bytes
+        if template_path.lower().endswith('.xls'):
+            # Convert .xls to .xlsx a single time instead of on every generate() call
+            self._template_bytes = self._convert_xls(template_path)
+        else:
+            with open(template_path, 'rb') as f:
+                self._template_bytes = f.read()
+
+        # Unpack the template archive once; generate() only regenerates the worksheet XML
+        with ZipFile(io.BytesIO(self._template_bytes)) as z:
+            self._template_entries = [(info, z.read(info)) for info in z.infolist()]
+
+        # Images are already compressed - store them as-is and only deflate the XML parts
+        for info, _ in self._template_entries:
+            if info.filename.startswith('xl/media/') or info.filename.lower().endswith(_COMPRESSED_MEDIA_EXTENSIONS):
+                info.compress_type = ZIP_STORED
+            else:
+                info.compress_type = ZIP_DEFLATED
+
+        # Resolve the worksheet to edit once (the active sheet, typically sheet1.xml)
+        parts = {info.filename: data for info, data in self._template_entries}
+        self._sheet_member = self._find_sheet_member(parts)
+        self._sheet_xml = parts[self._sheet_member]
+
+        # Index the template's <c> elements once: ref -> (start, end, attributes, body).
+        # Every generated file is the template sheet with a few of these spans replaced
+        self._sheet_cells = {match.group(1): (match.start(), match.end(), match.group(2), match.group(3))
+                             for match in _CELL_XML_RE.finditer(self._sheet_xml)}
+
+        # Index the shared string table once: text -> index of the template's plain-text entries.
+        # Generated text is appended to it rather than written inline into the sheet
+        self._shared_strings_member = None
+        shared_strings_xml = parts.get('xl/sharedStrings.xml')
+        if shared_strings_xml is not None and b'</sst>' in shared_strings_xml:
+            self._shared_strings_member = 'xl/sharedStrings.xml'
+            self._shared_strings_xml = shared_strings_xml
+            self._shared_strings, self._shared_strings_total = self._index_shared_strings(shared_strings_xml)
     
-    def _load_workbook(self, file_path):
+    def _find_sheet_member(self, parts):
         """
-        Load workbook from either .xls or .xlsx format.
-        Converts .xls to .xlsx preserving all formatting.
-        
+        Return the archive member name of the workbook's active sheet.
+        Falls back to the first xl/worksheets/*.xml if workbook.xml can't be resolved.
+
         Args:
-            file_path (str): Path to Excel file
-            
+            parts (dict): Archive member name -> bytes
+        """
+        try:
+            workbook = ET.fromstring(parts['xl/workbook.xml'])
+            rels = ET.fromstring(parts['xl/_rels/workbook.xml.rels'])
+
+            view = workbook.find(f'{{{_NS_MAIN}}}bookViews/{{{_NS_MAIN}}}workbookView')
+            active_tab = int(view.get('activeTab', 0)) if view is not None else 0
+            sheets = workbook.findall(f'{{{_NS_MAIN}}}sheets/{{{_NS_MAIN}}}sheet')
+            rel_id = sheets[active_tab].get(f'{{{_NS_REL}}}id')
+
+            for rel in rels:
+                if rel.get('Id') == rel_id:
+                    target = rel.get('Target')
+                    # Targets are relative to xl/ unless they are absolute package paths
+                    member = target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+                    if member in parts:
+                        return member
+        except (KeyError, IndexError, ValueError, ET.ParseError):
+            pass
+
+        # Use the first worksheet (typically sheet1.xml)
+        sheet_members = [name for name in parts
+                         if name.startswith('xl/worksheets/') and name.endswith('.xml')]
+        if not sheet_members:
+            raise Exception("No worksheet XML files found in Excel archive")
+        return sheet_members[0]
+
+    def _index_shared_strings(self, shared_strings_xml):
+        """
+        Return ({text: index}, number of <si> entries) for a sharedStrings.xml part.
+        Rich-text entries take up an index but are never reused.
+        """
+        si_elements = ET.fromstring(shared_strings_xml).findall(f'{{{_NS_MAIN}}}si')
+        index = {}
+        for i, si in enumerate(si_elements):
+            t_el = si.find(_T_TAG)
+            if t_el is not None and len(si) == 1:
+                index.setdefault(t_el.text or '', i)
+        return index, len(si_elements)
+
+    def _shared_strings_part(self, new_strings, added_refs):
+        """
+        Return the sharedStrings.xml bytes with new_strings (text -> index, in index order)
+        appended and the count/uniqueCount attributes updated.
+        """
+        shared_strings_xml = self._shared_strings_xml
+        if new_strings:
+            end = shared_strings_xml.rindex(b'</sst>')
+            new_si = b''.join(b'<si><t xml:space="preserve">%s</t></si>' % escape(text).encode('utf-8')
+                              for text in new_strings)
+            shared_strings_xml = shared_strings_xml[:end] + new_si + shared_strings_xml[end:]
+            shared_strings_xml = _SST_UNIQUE_COUNT_RE.sub(
+                lambda m: m.group(1) + str(self._shared_strings_total + len(new_strings)).encode() + m.group(3),
+                shared_strings_xml, count=1)
+        if added_refs:
+            shared_strings_xml = _SST_TOTAL_COUNT_RE.sub(
+                lambda m: m.group(1) + str(max(int(m.group(2)) + added_refs, 0)).encode() + m.group(3),
+                shared_strings_xml, count=1)
+        return shared_strings_xml
+
+    def _convert_xls(self, file_path):
+        """
+        Convert an .xls file to .xlsx (cell values of the first sheet).
+
+        Args:
+            file_path (str): Path to the .xls file
+
         Returns:
-            openpyxl Workbook object
+            bytes: Contents of the converted .xlsx file
         """
-        if file_path.lower().endswith('.xls'):
-            # Use pandas to read and convert .xls to .xlsx with formatting preserved
-            try:
-                import pandas as pd
-                import tempfile
-                
-                # Read all sheets from .xls file
-                xls_file = pd.ExcelFile(file_path)
-                
-                # Create a temporary .xlsx file
-                temp_xlsx = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
-                temp_xlsx_path = temp_xlsx.name
-                temp_xlsx.close()
-                
-                # Write to temporary .xlsx (pandas preserves basic formatting)
-                with pd.ExcelWriter(temp_xlsx_path, engine='openpyxl') as writer:
-                    for sheet_name in xls_file.sheet_names:
-                        df = pd.read_excel(file_path, sheet_name=sheet_name, header=None)
-                        df.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
-                
-                # Load the temporary .xlsx file
-                wb = openpyxl_load_workbook(temp_xlsx_path)
-                
-                # Store temp file path for cleanup later
-                self._temp_file = temp_xlsx_path
-                
-                return wb
-            except ImportError:
-                # Fallback if pandas not available
-                print("Warning: pandas not available, using basic conversion (some formatting may be lost)")
-                return self._load_workbook_basic(file_path)
-        else:
-            # Load as .xlsx directly
-            return openpyxl_load_workbook(file_path)
-    
+        # Copy the cell values with xlrd straight into an in-memory .xlsx
+        xlsx_wb = self._load_workbook_basic(file_path)
+        buffer = io.BytesIO()
+        xlsx_wb.save(buffer)
+        return buffer.getvalue()
+
     def _load_workbook_basic(self, file_path):
         """
-        Basic fallback conversion from .xls to .xlsx (minimal formatting)
+        Basic conversion from .xls to .xlsx (minimal formatting)
         """
         xls_book = xlrd.open_workbook(file_path)
         xls_sheet = xls_book.sheet_by_index(0)
         
-        xlsx_wb = Workbook()
-        xlsx_ws = xlsx_wb.active
+        # Write-only mode streams rows out without per-cell bookkeeping; the result can only be saved
+        xlsx_wb = Workbook(write_only=True)
+        xlsx_ws = xlsx_wb.create_sheet()
         
-        # Copy all cells from xls to xlsx
+        # Copy all cells from xls to xlsx a row at a time (empty cells stay empty)
         for row_idx in range(xls_sheet.nrows):
-            for col_idx in range(xls_sheet.ncols):
-                cell_value = xls_sheet.cell_value(row_idx, col_idx)
-                if cell_value:
-                    xlsx_ws.cell(row=row_idx + 1, column=col_idx + 1, value=cell_value)
+            xlsx_ws.append([cell_value or None for cell_value in xls_sheet.row_values(row_idx)])
         
         return xlsx_wb
     
-    def _modify_excel_in_place(self, excel_path, company_name, sakadastro, address, invoice_number, changes, items):
+    def _modify_sheet_xml(self, company_name, sakadastro, address, invoice_number, changes, items):
         """
-        Modify Excel file in-place using XML manipulation to preserve images.
-        This modifies the worksheet XML directly without losing image references.
+        Apply the invoice fields to the template worksheet XML.
+        Works on the XML directly so image references in the template stay intact.
+
+        Returns:
+            tuple: (worksheet XML bytes, sharedStrings.xml bytes or None if the template has none)
         """
-        try:
-            from zipfile import ZipFile, ZIP_DEFLATED
-            import tempfile
-            import xml.etree.ElementTree as ET
+        # Cell values to write, keyed by (column letters, row number)
+        values = {
+            ('D', 4): datetime.now(),
+            ('A', 12): company_name,
+            ('A', 13): sakadastro,
+            ('A', 14): address,
+            ('D', 5): invoice_number,
+        }
+        # Formula cells whose cached value must be cleared so Excel recalculates
+        # (D36 is likely a sum formula)
+        formula_cells = [('D', 36)]
 
-            # Create temp directory
-            temp_dir = tempfile.mkdtemp()
+        # Set items (rows 17-24)
+        start_row = 17
+        for row_num, item in enumerate(items[:8], start=start_row):
+            if isinstance(item, dict):
+                values[('A', row_num)] = item.get('type', '')
+                values[('B', row_num)] = item.get('quantity', '')
+                values[('C', row_num)] = item.get('price', '')
+                # Clear cached value from D row so formula recalculates
+                formula_cells.append(('D', row_num))
 
-            # Extract the Excel file
-            with ZipFile(excel_path, 'r') as z:
-                z.extractall(temp_dir)
+        if self._shared_strings_member is None:
+            string_index = None
+        else:
+            # Text this invoice adds to the shared string table, text -> index
+            new_strings = {}
+            added_refs = 0
 
-            # Find the correct worksheet XML file
-            import glob
-            sheet_xml_paths = glob.glob(os.path.join(temp_dir, 'xl', 'worksheets', '*.xml'))
-            if not sheet_xml_paths:
-                raise Exception("No worksheet XML files found in Excel archive")
+            def string_index(text):
+                nonlocal added_refs
+                added_refs += 1
+                index = self._shared_strings.get(text)
+                if index is None:
+                    index = new_strings.setdefault(text, self._shared_strings_total + len(new_strings))
+                return index
 
-            # Use the first worksheet (typically sheet1.xml)
-            sheet_xml_path = sheet_xml_paths[0]
-            
-            # Parse XML
-            ET.register_namespace('', 'http://schemas.openxmlformats.org/spreadsheetml/2006/main')
-            ET.register_namespace('r', 'http://schemas.openxmlformats.org/officeDocument/2006/relationships')
-            
-            tree = ET.parse(sheet_xml_path)
-            root = tree.getroot()
-            
-            ns = {'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
-            
-            # Find sheet data
-            sheet_data = root.find('main:sheetData', ns)
-            if sheet_data is None:
-                raise Exception("Could not find sheetData in worksheet")
-            
-            # Create a simple cell value setter
-            def set_cell(sheet_data, cell_ref, value):
-                """Set a cell value in the XML"""
-                # Parse cell reference (e.g., "A12")
-                import re
-                match = re.match(r'([A-Z]+)(\d+)', cell_ref)
-                if not match:
-                    return
-                
-                col_letters, row_num = match.groups()
-                row_num = int(row_num)
-                
-                # Find or create row
-                row = None
-                for r in sheet_data.findall('main:row', ns):
-                    if int(r.get('r')) == row_num:
-                        row = r
-                        break
-                
+            # Template cells being overwritten drop their shared string reference
+            for col_letters, row_num in values:
+                cell = self._sheet_cells.get(f'{col_letters}{row_num}'.encode())
+                if cell is not None and b't="s"' in cell[2] and not (cell[3] and b'<f' in cell[3]):
+                    added_refs -= 1
+
+        # Decide on a path before any cell is built, so string_index counts each reference once
+        if all(f'{col_letters}{row_num}'.encode() in self._sheet_cells for col_letters, row_num in values):
+            patched = self._patch_sheet_xml(values, formula_cells, string_index)
+        else:
+            # A target cell is missing from the template; the DOM path can create it
+            patched = self._modify_sheet_xml_dom(self._sheet_xml, values, formula_cells, string_index)
+
+        if string_index is None:
+            return patched, None
+        return patched, self._shared_strings_part(new_strings, added_refs)
+
+    def _patch_sheet_xml(self, values, formula_cells, string_index=None):
+        """
+        Splice new <c> elements into the template worksheet XML bytes without building a DOM,
+        using the cell index built in __init__. Every cell in values must exist in the template.
+        """
+        edits = {}
+
+        for col_letters, row_num in formula_cells:
+            ref = f'{col_letters}{row_num}'.encode()
+            cell = self._sheet_cells.get(ref)
+            if cell is None:
+                continue
+            start, end, attrs, body = cell
+            if body is not None and b'<f' in body:
+                # Remove cached <v> from the formula cell
+                edits[ref] = (start, end, b'<c r="%s"%s>%s</c>' % (ref, attrs, _CELL_V_RE.sub(b'', body)))
+
+        for (col_letters, row_num), value in values.items():
+            ref = f'{col_letters}{row_num}'.encode()
+            start, end, attrs, body = self._sheet_cells[ref]
+            # Skip if cell has a formula - preserve template formulas
+            if body is not None and b'<f' in body:
+                continue
+            edits[ref] = (start, end, _cell_xml(ref, attrs, value, string_index))
+
+        sheet_xml = self._sheet_xml
+        parts = []
+        pos = 0
+        for start, end, new_cell in sorted(edits.values()):
+            parts.append(sheet_xml[pos:start])
+            parts.append(new_cell)
+            pos = end
+        parts.append(sheet_xml[pos:])
+        return b''.join(parts)
+
+    def _modify_sheet_xml_dom(self, sheet_xml, values, formula_cells, string_index=None):
+        """
+        Fallback for _patch_sheet_xml: apply the changes through ElementTree,
+        creating any rows/cells the template is missing.
+        """
+        # Parse XML
+        root = etree.fromstring(sheet_xml)
+        
+        # Find sheet data
+        sheet_data = root.find(_SHEET_DATA_TAG)
+        if sheet_data is None:
+            raise Exception("Could not find sheetData in worksheet")
+
+        # Index rows and cells once so every lookup below is a dict hit
+        rows = {int(r.get('r')): r for r in sheet_data.iter(_ROW_TAG)}
+        cells = {c.get('r'): c for c in sheet_data.iter(_C_TAG)}
+
+        def get_cell(col_letters, row_num):
+            """Find or create the <c> element (and its <row>) for e.g. 'A', 12"""
+            cell_address = f'{col_letters}{row_num}'
+            cell = cells.get(cell_address)
+            if cell is None:
+                row = rows.get(row_num)
                 if row is None:
-                    row = ET.SubElement(sheet_data, '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}row')
+                    row = etree.SubElement(sheet_data, _ROW_TAG)
                     row.set('r', str(row_num))
-                
-                # Find or create cell
-                cell_address = f'{col_letters}{row_num}'
-                cell = None
-                for c in row.findall('main:c', ns):
-                    if c.get('r') == cell_address:
-                        cell = c
-                        break
-                
-                if cell is None:
-                    cell = ET.SubElement(row, '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}c')
-                    cell.set('r', cell_address)
-                
-                # Skip if cell has a formula - preserve template formulas
-                if cell.find('main:f', ns) is not None:
-                    return
-                
-                # Remove existing children to avoid keeping shared references
-                for child in list(cell):
-                    cell.remove(child)
-
-                # Set value correctly depending on type.
-                # For numbers, use a plain <v> element. For strings, use inlineStr
-                if value is None:
-                    return
-                # Datetime: write as Excel serial number so Excel will display formatted date/time
-                if isinstance(value, datetime):
-                    # Excel epoch: 1899-12-30
-                    epoch = datetime(1899, 12, 30)
-                    delta = value - epoch
-                    serial = delta.total_seconds() / 86400.0
-                    # Write numeric value
-                    cell.attrib.pop('t', None)
-                    v = ET.SubElement(cell, '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}v')
-                    # keep full precision
-                    v.text = repr(serial)
-                # Numeric types (int/float)
-                elif isinstance(value, (int, float)):
-                    cell.attrib.pop('t', None)
-                    v = ET.SubElement(cell, '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}v')
-                    v.text = str(value)
-                else:
-                    # Use inline string to avoid messing with sharedStrings.xml
-                    cell.set('t', 'inlineStr')
-                    is_el = ET.SubElement(cell, '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}is')
-                    t_el = ET.SubElement(is_el, '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}t')
-                    t_el.text = str(value)
-            
-            # Set required fields
-            set_cell(sheet_data, 'D4', datetime.now())
-            set_cell(sheet_data, 'A12', company_name)
-            set_cell(sheet_data, 'A13', sakadastro)
-            set_cell(sheet_data, 'A14', address)
-            set_cell(sheet_data, 'D5', invoice_number)
-            
-            # Helper to clear cached value from formula cells so Excel recalculates
-            def clear_formula_cache(sheet_data, cell_ref):
-                """Remove <v> element from formula cells to force recalculation"""
-                import re
-                match = re.match(r'([A-Z]+)(\d+)', cell_ref)
-                if not match:
-                    return
-                col_letters, row_num = match.groups()
-                row_num = int(row_num)
-                cell_address = f'{col_letters}{row_num}'
-                for r in sheet_data.findall('main:row', ns):
-                    if int(r.get('r')) == row_num:
-                        for c in r.findall('main:c', ns):
-                            if c.get('r') == cell_address:
-                                # If this cell has a formula, remove cached <v>
-                                if c.find('main:f', ns) is not None:
-                                    v_elem = c.find('main:v', ns)
-                                    if v_elem is not None:
-                                        c.remove(v_elem)
-                                break
-                        break
-            
-            # Set items
-            start_row = 17
-            for i, item in enumerate(items):
-                if i >= 8:
-                    break
-                row = start_row + i
-                if isinstance(item, dict):
-                    set_cell(sheet_data, f'A{row}', item.get('type', ''))
-                    set_cell(sheet_data, f'B{row}', item.get('quantity', ''))
-                    set_cell(sheet_data, f'C{row}', item.get('price', ''))
-                    # Clear cached value from D row so formula recalculates
-                    clear_formula_cache(sheet_data, f'D{row}')
-            
-            # Also clear D36 (likely a sum formula) to force recalculation
-            clear_formula_cache(sheet_data, 'D36')
-            
-            # Save modified XML
-            tree.write(sheet_xml_path, encoding='utf-8', xml_declaration=True)
-            
-            # Re-zip the file
-            with ZipFile(excel_path, 'w', ZIP_DEFLATED) as z:
-                for root_dir, dirs, files in os.walk(temp_dir):
-                    for file in files:
-                        file_path = os.path.join(root_dir, file)
-                        arcname = os.path.relpath(file_path, temp_dir)
-                        z.write(file_path, arcname)
+                    rows[row_num] = row
+                cell = etree.SubElement(row, _C_TAG)
+                cell.set('r', cell_address)
+                cells[cell_address] = cell
+            return cell
+
+        # Create a simple cell value setter
+        def set_cell(col_letters, row_num, value):
+            """Set a cell value in the XML"""
+            cell = get_cell(col_letters, row_num)
             
-            # Clean up temp directory
-            shutil.rmtree(temp_dir)
+            # Skip if cell has a formula - preserve template formulas
+            if cell.find(_F_TAG) is not None:
+                return
             
-            print(f"Excel file modified in-place: {excel_path}")
+            # Remove existing children to avoid keeping shared references
+            for child in list(cell):
+                cell.remove(child)
+
+            # Set value correctly depending on type.
+            # For numbers, use a plain <v> element. For strings, a shared string reference
+            if value is None:
+                return
+            # Datetime: write as Excel serial number so Excel will display formatted date/time
+            if isinstance(value, datetime):
+                serial = (value - _EXCEL_EPOCH).total_seconds() / _SECONDS_PER_DAY
+                # Write numeric value
+                cell.attrib.pop('t', None)
+                v = etree.SubElement(cell, _V_TAG)
+                # keep full precision
+                v.text = repr(serial)
+            # Numeric types (int/float)
+            elif isinstance(value, (int, float)):
+                cell.attrib.pop('t', None)
+                v = etree.SubElement(cell, _V_TAG)
+                v.text = str(value)
+            elif string_index is not None:
+                cell.set('t', 's')
+                v = etree.SubElement(cell, _V_TAG)
+                v.text = str(string_index(str(value)))
+            else:
+                # Template without a shared string table: use an inline string
+                cell.set('t', 'inlineStr')
+                is_el = etree.SubElement(cell, _IS_TAG)
+                t_el = etree.SubElement(is_el, _T_TAG)
+                t_el.text = str(value)
+        
+        # Helper to clear cached value from formula cells so Excel recalculates
+        def clear_formula_cache(col_letters, row_num):
+            """Remove <v> element from formula cells to force recalculation"""
+            c = cells.get(f'{col_letters}{row_num}')
+            # If this cell has a formula, remove cached <v>
+            if c is not None and c.find(_F_TAG) is not None:
+                v_elem = c.find(_V_TAG)
+                if v_elem is not None:
+                    c.remove(v_elem)
+
+        for (col_letters, row_num), value in values.items():
+            set_cell(col_letters, row_num, value)
+
+        for col_letters, row_num in formula_cells:
+            clear_formula_cache(col_letters, row_num)
             
-        except Exception as e:
-            print(f"Error modifying Excel in-place: {e}")
-            import traceback
-            traceback.print_exc()
-    
-    def _preserve_images_in_copy(self, template_path, output_path):
+        if etree is not ET:
+            # lxml can emit standalone="yes" itself
+            return etree.tostring(root, encoding='utf-8', xml_declaration=True, standalone=True)
+        return etree.tostring(root, encoding='utf-8', xml_declaration=True)
+
+    def _write_xlsx(self, output_path, sheet_xml, shared_strings_xml=None):
         """
-        Manually copy images, drawings, and relationships from template to output.
-        This is a workaround for openpyxl not preserving images and drawing references.
+        Write the output archive (to a path or binary file object) from the cached template parts.
+        Every part is copied verbatim except the worksheet, which is replaced by sheet_xml,
+        and the shared string table if shared_strings_xml is given.
         """
-        try:
-            from zipfile import ZipFile, ZIP_DEFLATED
-            import tempfile
-            
-            # Read from template
-            with ZipFile(template_path, 'r') as template_zip:
-                # Find all files that need to be preserved
-                files_to_preserve = []
-                
-                # Media/image files
-                for f in template_zip.namelist():
-                    if f.startswith('xl/media/') or f.startswith('xl/drawings/'):
-                        files_to_preserve.append(f)
-                
-                if not files_to_preserve:
-                    return  # No images/drawings to preserve
-                
-                # Also get relationship files for drawings
-                for f in template_zip.namelist():
-                    if 'xl/drawings' in f and '.rels' in f:
-                        files_to_preserve.append(f)
-                    if f == 'xl/worksheets/_rels/sheet1.xml.rels':
-                        files_to_preserve.append(f)
-                
-                if not files_to_preserve:
-                    return
-                
-                # Create temp file
-                with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as temp_file:
-                    temp_path = temp_file.name
-                
-                # Copy output to temp
-                shutil.copy2(output_path, temp_path)
-                
-                # Add preserved files to output
-                with ZipFile(temp_path, 'a', ZIP_DEFLATED) as output_zip:
-                    for file_path in files_to_preserve:
-                        try:
-                            if file_path not in output_zip.namelist():
-                                file_data = template_zip.read(file_path)
-                                output_zip.writestr(file_path, file_data)
-                        except Exception as e:
-                            print(f"Could not preserve {file_path}: {e}")
-                
-                # Copy temp back to output
-                shutil.copy2(temp_path, output_path)
-                
-                # Clean up temp
-                try:
+        if isinstance(output_path, (str, os.PathLike)):
+            # Build the archive in memory so the file system only sees one write
+            buffer = io.BytesIO()
+            self._write_xlsx(buffer, sheet_xml, shared_strings_xml)
+
+            # Write next to the target and rename over it, so a download of the same
+            # file never sees a half-written archive
+            temp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(temp_path, 'xb') as f:
+                    f.write(buffer.getbuffer())
+                os.replace(temp_path, output_path)
+            except BaseException:
+                if os.path.exists(temp_path):
                     os.remove(temp_path)
-                except:
-                    pass
-                
-                print(f"Preserved {len(files_to_preserve)} drawing/image files")
-        except Exception as e:
-            print(f"Note: Could not preserve images: {e}")
-            # Don't fail - continue without images
-    
+                raise
+            return
+
+        # Each part uses the compression chosen in __init__; level 1 is plenty for
+        # a few KB of XML and much cheaper than the default level
+        with ZipFile(output_path, 'w', ZIP_DEFLATED) as z:
+            for info, data in self._template_entries:
+                if info.filename == self._sheet_member:
+                    data = sheet_xml
+                elif shared_strings_xml is not None and info.filename == self._shared_strings_member:
+                    data = shared_strings_xml
+                # writestr() fills in size/CRC on the ZipInfo it is given, so hand it
+                # a copy - the cached one is shared by concurrent generate() calls
+                z.writestr(copy(info), data, compresslevel=1)
+
     def generate(self, output_path, company_name, sakadastro, address, invoice_number, changes=None, items=None):
         """
         Generate a new Excel file based on template with specified changes.
 
         Args:
-            output_path (str): Path where the new Excel file will be saved
+            output_path (str or file): Path where the new Excel file will be saved,
+                          or a writable binary file object (e.g. io.BytesIO) to keep it in memory
             company_name (str): Company name for cell A12 (will be prefixed with "კომპ/სახელი")
             sakadastro (str): Sakadastro value for cell A13 (will be prefixed with "ს/კ")
             address (str): Address for cell A14 (will be prefixed with "მისამართი")
@@ -349,7 +518,7 @@ class ExcelTemplateGenerator:
                                   {'type': 'Service B', 'quantity': 1, 'price': 50}]
 
         Returns:
-            str: Path to the generated file
+            str or file: output_path, as passed in
         """
         if changes is None:
             changes = {}
@@ -361,29 +530,162 @@ class ExcelTemplateGenerator:
         sakadastro = f"ს/კ {sakadastro}" if sakadastro else "ს/კ"
         address = f"მისამართი {address}" if address else "მისამართი"
 
-        # Create output directory if it doesn't exist
-        output_dir = os.path.dirname(output_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
+        # Stream the cached template parts into the output, replacing only the worksheet XML
+        # and shared strings. This preserves ALL content including images and their references
+        sheet_xml, shared_strings_xml = self._modify_sheet_xml(company_name, sakadastro, address,
+                                                               invoice_number, changes, items)
+        self._write_xlsx(output_path, sheet_xml, shared_strings_xml)
 
-        # IMPORTANT: Copy the entire template file first to preserve images, formatting, and all content
-        shutil.copy2(self.template_path, output_path)
+        if isinstance(output_path, (str, os.PathLike)):
+            print(f"Excel file generated: {output_path}")
 
-        # Modify the copied file directly by extracting, modifying XML, and re-zipping
-        # This preserves ALL content including images and their references
-        self._modify_excel_in_place(output_path, company_name, sakadastro, address, invoice_number, changes, items)
+        return output_path
+    
+    @classmethod
+    def start_pdf_server(cls):
+        """
+        Start a persistent LibreOffice daemon (unoserver) for PDF conversion,
+        or respawn it if it has died. Safe to call repeatedly.
 
-        print(f"Excel file generated: {output_path}")
+        Returns:
+            bool: False if unoserver is not installed
+        """
+        if shutil.which('unoserver') is None or shutil.which('unoconvert') is None:
+            return False
+
+        with cls._pdf_server_lock:
+            if cls._pdf_server is None or cls._pdf_server.poll() is not None:
+                cls._spawn_pdf_server()
+        return True
+
+    @classmethod
+    def _spawn_pdf_server(cls):
+        """Start the unoserver process; the caller holds _pdf_server_lock"""
+        cls._pdf_server = subprocess.Popen(
+            ['unoserver', '--interface', '127.0.0.1', '--port', str(_PDF_SERVER_PORT)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        cls._pdf_server_ready = False
+        atexit.register(cls._pdf_server.terminate)
 
-        # Clean up temporary file if it was created
-        if hasattr(self, '_temp_file') and os.path.exists(self._temp_file):
+    @classmethod
+    def _pdf_server_available(cls):
+        """
+        Return True once the daemon accepts connections. Only a daemon started through
+        start_pdf_server() is used (and respawned if it died); one-off processes such as
+        the CLI never start it, as that would cost more than the conversion it saves.
+        """
+        if cls._pdf_server is None:
+            return False
+
+        with cls._pdf_server_lock:
+            if cls._pdf_server.poll() is not None:
+                cls._spawn_pdf_server()
+
+            # A fresh daemon needs a few seconds before unoconvert can reach it
+            if not cls._pdf_server_ready:
+                deadline = time.monotonic() + _PDF_SERVER_START_TIMEOUT
+                while True:
+                    try:
+                        socket.create_connection(('127.0.0.1', _PDF_SERVER_PORT), timeout=1).close()
+                        break
+                    except OSError:
+                        if cls._pdf_server.poll() is not None or time.monotonic() > deadline:
+                            return False
+                        time.sleep(0.2)
+                cls._pdf_server_ready = True
+        return True
+
+    def _convert_with_pdf_server(self, excel_abs_path, pdf_path):
+        """
+        Convert through the warm unoserver daemon instead of starting LibreOffice.
+        Returns False when the daemon is unavailable so the caller can fall back.
+        """
+        if not self._pdf_server_available():
+            return False
+
+        command = [
+            'unoconvert',
+            '--host', '127.0.0.1',
+            '--port', str(_PDF_SERVER_PORT),
+            '--convert-to', 'pdf',
+            excel_abs_path,
+            os.path.abspath(pdf_path)
+        ]
+        try:
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, timeout=60)
+            return True
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            # Daemon still starting up or crashed - use a one-off LibreOffice run this time
+            print(f"unoserver conversion failed, falling back to LibreOffice: {e}")
+            return False
+
+    @classmethod
+    def _libreoffice_profile(cls):
+        """
+        Return this thread's LibreOffice profile directory, creating it on first use.
+        Concurrent runs sharing ~/.config/libreoffice block on its lock, while a profile
+        reused by one thread only pays LibreOffice's first-run initialisation once.
+        """
+        profile_dir = getattr(cls._libreoffice_profiles, 'path', None)
+        if profile_dir is None:
+            if os.path.exists('/snap/bin/libreoffice'):
+                # The snap has a private /tmp; its common data directory is at the same path
+                # for the snap and for us, so the profile can be removed again at exit
+                base_dir = os.path.expanduser('~/snap/libreoffice/common')
+                os.makedirs(base_dir, exist_ok=True)
+            else:
+                base_dir = None
+            profile_dir = tempfile.mkdtemp(prefix='lo_profile_', dir=base_dir)
+            atexit.register(shutil.rmtree, profile_dir, ignore_errors=True)
+            cls._libreoffice_profiles.path = profile_dir
+        return profile_dir
+
+    def _run_libreoffice(self, excel_abs_paths, output_dir, timeout):
+        """
+        Convert files to PDF with a single headless LibreOffice run.
+        LibreOffice accepts several input files, so its start-up is paid once per call.
+        """
+        profile_dir = self._libreoffice_profile()
+
+        # Use LibreOffice to convert Excel to PDF with explicit image inclusion
+        # --headless: Run without GUI
+        # --convert-to pdf: Convert to PDF with default settings
+        # --outdir: Output directory
+        command = [
+            '/snap/bin/libreoffice',
+            f'-env:UserInstallation=file://{profile_dir}',
+            '--headless',
+            '--norestore',  # Don't restore previous session
+            '--convert-to', 'pdf',
+            '--outdir', output_dir,
+            *excel_abs_paths
+        ]
+        
+        def run():
+            # Output is only looked at when the conversion fails
             try:
-                os.remove(self._temp_file)
-            except:
-                pass
+                subprocess.run(command, check=True, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, timeout=timeout)
+            except subprocess.CalledProcessError:
+                # Retry with the output captured so the error says why
+                result = subprocess.run(command, capture_output=True, timeout=timeout)
+                if result.returncode != 0:
+                    raise Exception(f"LibreOffice PDF conversion failed: "
+                                    f"{result.stderr.decode(errors='replace').strip()}")
+
+        # Try standard libreoffice if snap version not available
+        try:
+            try:
+                run()
+            except FileNotFoundError:
+                command[0] = 'libreoffice'
+                run()
+        except subprocess.TimeoutExpired:
+            raise Exception(f"LibreOffice PDF conversion timed out after {timeout} seconds")
 
-        return output_path
-    
     def generate_pdf(self, excel_path, pdf_path=None):
         """
         Convert an Excel file to PDF using LibreOffice.
@@ -404,35 +706,19 @@ class ExcelTemplateGenerator:
             pdf_path = os.path.splitext(excel_path)[0] + '.pdf'
         
         try:
-            # Use LibreOffice to convert Excel to PDF with explicit image inclusion
-            # --headless: Run without GUI
-            # --convert-to pdf: Convert to PDF with default settings
-            # --outdir: Output directory
-            
             output_dir = os.path.dirname(pdf_path) or '.'
             excel_abs_path = os.path.abspath(excel_path)
             
             # Ensure output directory exists
             if not os.path.exists(output_dir):
                 os.makedirs(output_dir, exist_ok=True)
+
+            # Prefer the warm daemon; starting LibreOffice per file costs seconds
+            if self._convert_with_pdf_server(excel_abs_path, pdf_path):
+                print(f"PDF file generated: {pdf_path}")
+                return pdf_path
             
-            command = [
-                '/snap/bin/libreoffice',
-                '--headless',
-                '--norestore',  # Don't restore previous session
-                '--convert-to', 'pdf',
-                '--outdir', output_dir,
-                excel_abs_path
-            ]
-            
-            # Try standard libreoffice if snap version not available
-            try:
-                result = subprocess.run(command, check=True, capture_output=True, timeout=60)
-            except FileNotFoundError:
-                command[0] = 'libreoffice'
-                result = subprocess.run(command, check=True, capture_output=True, timeout=60)
-            except subprocess.TimeoutExpired:
-                raise Exception("LibreOffice PDF conversion timed out after 60 seconds")
+            self._run_libreoffice([excel_abs_path], output_dir, timeout=30)
             
             # Verify PDF was created
             if not os.path.exists(pdf_path):
@@ -446,13 +732,59 @@ class ExcelTemplateGenerator:
             print("Make sure LibreOffice is installed: sudo apt install libreoffice")
             raise
     
+    def generate_pdfs(self, excel_paths, output_dir):
+        """
+        Convert several Excel files to PDF, starting LibreOffice only once.
+        
+        Args:
+            excel_paths (list): Paths to the Excel files to convert
+            output_dir (str): Directory for the PDF files (named after the Excel files)
+        
+        Returns:
+            list: Paths to the generated PDF files
+        """
+        for excel_path in excel_paths:
+            if not os.path.exists(excel_path):
+                raise FileNotFoundError(f"Excel file not found: {excel_path}")
+        
+        excel_abs_paths = [os.path.abspath(excel_path) for excel_path in excel_paths]
+        pdf_paths = [os.path.join(output_dir, os.path.splitext(os.path.basename(excel_path))[0] + '.pdf')
+                     for excel_path in excel_paths]
+
+        # PDFs are named after the Excel file, so the same name twice would overwrite one of them
+        if len(set(pdf_paths)) != len(pdf_paths):
+            raise ValueError("Excel files must have distinct names to be converted into one directory")
+        
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+
+            # Prefer the warm daemon; whatever it fails on is converted in one LibreOffice run
+            remaining = [excel_abs_path for excel_abs_path, pdf_path in zip(excel_abs_paths, pdf_paths)
+                         if not self._convert_with_pdf_server(excel_abs_path, pdf_path)]
+            if remaining:
+                self._run_libreoffice(remaining, output_dir, timeout=30 + 5 * len(remaining))
+            
+            # Verify PDFs were created
+            for pdf_path in pdf_paths:
+                if not os.path.exists(pdf_path):
+                    raise Exception(f"PDF file was not created at {pdf_path}")
+            
+            print(f"PDF files generated: {len(pdf_paths)} in {output_dir}")
+            return pdf_paths
+        
+        except Exception as e:
+            print(f"Error generating PDF: {e}")
+            print("Make sure LibreOffice is installed: sudo apt install libreoffice")
+            raise
+
     def generate_multiple(self, output_dir, changes_list):
         """
         Generate multiple Excel files from the template.
         
         Args:
             output_dir (str): Directory where files will be saved
-            changes_list (list): List of tuples (filename, company_name, sakadastro, address, invoice_number, items, additional_changes_dict)
+            changes_list (list): List of InvoiceSpec or tuples (filename, company_name, sakadastro, address, invoice_number, items, additional_changes_dict)
+                                items and additional_changes_dict are optional; a 6-tuple may end with either
                                 Example: [('file1.xlsx', 'Company A', 'Sak001', 'Address 1', 'INV001', 
                                           [{'type': 'Item1', 'quantity': 2, 'price': 100}], {}), 
                                          ('file2.xlsx', 'Company B', 'Sak002', 'Address 2', 'INV002', [], {})]
@@ -460,29 +792,39 @@ class ExcelTemplateGenerator:
         Returns:
             list: Paths to all generated files
         """
-        generated_files = []
-        
-        for item in changes_list:
-            if len(item) == 5:
-                filename, company_name, sakadastro, address, invoice_number = item
-                items = []
-                additional_changes = {}
-            elif len(item) == 6:
-                filename, company_name, sakadastro, address, invoice_number, items_or_changes = item
-                if isinstance(items_or_changes, list):
-                    items = items_or_changes
-                    additional_changes = {}
-                else:
-                    items = []
-                    additional_changes = items_or_changes
-            else:
-                filename, company_name, sakadastro, address, invoice_number, items, additional_changes = item
-            
-            output_path = os.path.join(output_dir, filename)
-            self.generate(output_path, company_name, sakadastro, address, invoice_number, additional_changes, items)
-            generated_files.append(output_path)
-        
-        return generated_files
+        # Create output directory once for the whole batch
+        os.makedirs(output_dir, exist_ok=True)
+
+        # generate() arguments for each invoice
+        jobs = [(os.path.join(output_dir, spec.filename), spec.company, spec.sakadastro, spec.address,
+                 spec.invoice_number, spec.changes, spec.items)
+                for spec in map(_normalize_invoice, changes_list)]
+
+        cpu_count = os.cpu_count() or 1
+        if cpu_count == 1 or len(jobs) < _PROCESS_POOL_MIN_JOBS:
+            return [self.generate(*job) for job in jobs]
+
+        # Invoices are independent, so spread them over one process per core.
+        # Each worker loads the template once (see _init_worker)
+        workers = min(cpu_count, len(jobs))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.template_path,)) as executor:
+            return list(executor.map(_generate_one, jobs))
+
+
+# Generator owned by each generate_multiple() worker process
+_worker_generator = None
+
+
+def _init_worker(template_path):
+    """ProcessPoolExecutor initializer: load the template once per worker process"""
+    global _worker_generator
+    _worker_generator = ExcelTemplateGenerator(template_path)
+
+
+def _generate_one(job):
+    """Generate one invoice in a worker process; job holds the generate() arguments"""
+    return _worker_generator.generate(*job)
 
 
 # Example usage
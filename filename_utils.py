@@ -0,0 +1,26 @@
+"""
+Filename helpers shared by the web app and the CLI
+"""
+
+from werkzeug.utils import secure_filename
+
+# Spaces become underscores and the characters that are never allowed
+# in output filenames (/ \ : * ? " < > |) are removed, all in one pass
+_FILENAME_TABLE = str.maketrans(' ', '_', '/\\:*?"<>|')
+
+def safe_filename(filename):
+    """Create safe filename while preserving Unicode characters"""
+    # Remove leading/trailing whitespace
+    filename = filename.strip()
+    # Replace spaces with underscores and remove only truly problematic characters
+    filename = filename.translate(_FILENAME_TABLE)
+    # Remove leading dots
+    filename = filename.lstrip('.')
+
+    # Only use secure_filename for ASCII characters, otherwise keep Unicode
+    # If it contains Unicode characters, skip secure_filename to preserve them
+    if filename.isascii():
+        # If it's all ASCII, use secure_filename for extra safety
+        filename = secure_filename(filename)
+
+    return filename if filename else 'output'
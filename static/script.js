@@ -98,6 +98,7 @@ function handleSubmit(e) {
         }
         return response.json();
     })
+    .then(data => waitForJob(data.job_id))
     .then(data => {
         submitBtn.disabled = false;
         submitBtn.textContent = 'Generate Invoice';
@@ -114,6 +115,31 @@ function handleSubmit(e) {
     });
 }
 
+function waitForJob(jobId) {
+    // Follow the background generation job via server-sent events
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/progress/${jobId}`);
+        
+        source.onmessage = function(e) {
+            const event = JSON.parse(e.data);
+            if (event.stage === 'done') {
+                source.close();
+                resolve(event);
+            } else if (event.stage === 'error') {
+                source.close();
+                reject(new Error(event.error || 'An error occurred'));
+            } else if (event.stage === 'pdf') {
+                showMessage('⏳ Creating PDF...', 'loading');
+            }
+        };
+        
+        source.onerror = function() {
+            source.close();
+            reject(new Error('Lost connection to the server'));
+        };
+    });
+}
+
 function displayResults(data) {
     const resultsSection = document.getElementById('results');
     const excelFile = document.getElementById('excelFile');